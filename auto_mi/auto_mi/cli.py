@@ -49,6 +49,11 @@ def train_cli(
     subject_model_group.add_argument(
         "--train_subject_models", action="store_true", help="Train the subject models."
     )
+    subject_model_group.add_argument(
+        "--subject_model_quantise",
+        action="store_true",
+        help="Quantise the linear layers of the subject models to int8 when evaluating them.",
+    )
     subject_model_group.add_argument(
         "--subject_model_count",
         type=int,
@@ -76,6 +81,22 @@ def train_cli(
         help="Batch size for training the subject models",
         default=default_subject_model_batch_size,
     )
+    subject_model_group.add_argument(
+        "--subject_model_num_workers",
+        type=int,
+        help="Number of DataLoader worker processes per subject model.",
+        default=0,
+    )
+    subject_model_group.add_argument(
+        "--subject_model_vectorise",
+        action="store_true",
+        help="Train all the subject models as one batched model. Requires the task's examples to be tensor backed.",
+    )
+    subject_model_group.add_argument(
+        "--subject_model_cpu_bfloat16",
+        action="store_true",
+        help="Train the subject models in bfloat16 mixed precision when on CPU. Only faster on CPUs with native bfloat16 support.",
+    )
     subject_model_group.add_argument(
         "--subject_model_num_classes",
         type=int,
@@ -206,10 +227,13 @@ def train_cli(
         args.subject_model_batch_size,
         lr=args.subject_model_lr,
         device=args.device,
+        num_workers=args.subject_model_num_workers,
+        vectorise=args.subject_model_vectorise,
+        cpu_bfloat16=args.subject_model_cpu_bfloat16,
     )
 
     if args.evaluate_subject_models:
-        evaluate_subject_model(task, subject_model_class, subject_model_io, trainer, model_count=args.subject_model_count)
+        evaluate_subject_model(task, subject_model_class, subject_model_io, trainer, model_count=args.subject_model_count, quantise=args.subject_model_quantise)
         quit()
 
     if args.train_subject_models:
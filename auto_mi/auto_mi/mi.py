@@ -168,7 +168,7 @@ def pretrain_mi_model(
         token_prediction_model.train()
         total_loss = 0.0
         for i, (inputs, masks, targets) in enumerate(train_dataloader):
-            optimizer.zero_grad()
+            optimizer.zero_grad(set_to_none=True)
             outputs = token_prediction_model(
                 inputs.to(device, non_blocking=True),
                 masks.to(device, non_blocking=True),
@@ -187,7 +187,7 @@ def pretrain_mi_model(
         token_prediction_model.eval()
         total_loss = 0.0
         for i, (inputs, masks, targets) in enumerate(validation_dataloader):
-            optimizer.zero_grad()
+            optimizer.zero_grad(set_to_none=True)
             outputs = token_prediction_model(
                 inputs.to(device, non_blocking=True),
                 masks.to(device, non_blocking=True),
@@ -342,7 +342,7 @@ def train_mi_model(
         total_loss = 0.0
         accuracy = 0.
         for i, (inputs, masks, targets) in enumerate(train_dataloader):
-            optimizer.zero_grad()
+            optimizer.zero_grad(set_to_none=True)
             outputs = interpretability_model(
                 inputs.to(device, non_blocking=True),
                 masks.to(device, non_blocking=True),
@@ -5,6 +5,7 @@ from time import gmtime, strftime
 import uuid
 
 import torch
+import torch.nn as nn
 
 from auto_mi.tasks import VAL
 
@@ -77,8 +78,13 @@ def train_subject_models(
 
 
 def evaluate_subject_model(
-    task, subject_model_class, subject_model_io, trainer, samples=100, model_count=100
+    task, subject_model_class, subject_model_io, trainer, samples=100, model_count=100, quantise=False
 ):
+    """
+    Prints the accuracy of a sample of the subject models on their validation
+    examples. If quantise is set, the linear layers are dynamically quantised to
+    int8 before evaluation, which is faster on CPU but may cost some accuracy.
+    """
     metadata = subject_model_io.get_metadata()
     subject_model_names, _ = get_matching_subject_models_names(
         subject_model_io, trainer, task
@@ -102,6 +108,10 @@ def evaluate_subject_model(
             subject_model,
             model_id,
         )
+        if quantise:
+            model = torch.ao.quantization.quantize_dynamic(
+                model.eval(), {nn.Linear}, dtype=torch.qint8
+            )
         correct = []
         for _ in range(samples):
             i = random.randint(0, len(example) - 1)
@@ -143,6 +153,15 @@ def get_matching_subject_models_names(
             reasons["trainer"] += 1
             continue
 
+        # Older models will not have their training precision in their
+        # metadata, but were all trained in float32
+        if not all(
+            md["trainer"].get(key, False) == trainer_metadata.get(key, False)
+            for key in ["amp", "cpu_bfloat16"]
+        ):
+            reasons["trainer"] += 1
+            continue
+
         if md["id"] in exclude:
             reasons["exclude"] += 1
             continue
@@ -56,6 +56,11 @@ class Task(MetadataBase, ABC):
 
 
 class Example(MetadataBase, Dataset, ABC):
+    # Set by examples whose X and y attributes are tensors that are ready for
+    # the model and criterion as they are, with the permutation already
+    # applied, so trainers can batch them directly rather than via __getitem__.
+    tensor_backed = False
+
     @abstractmethod
     def get_target(self):
         pass
@@ -105,6 +110,18 @@ class SimpleTask(Task):
         return F.nll_loss(x, y)
 
 
+def split_dataset(X, y, num_classes=-1):
+    """
+    Filters out the examples where the class is not one of the first
+    num_classes, then splits the remainder into train and test sets.
+    """
+    if num_classes != -1:
+        X = X[y < num_classes]
+        y = y[y < num_classes]
+
+    return train_test_split(X, y, test_size=0.2, random_state=42)
+
+
 class SimpleExample(Example, ABC):
     def __init__(self, permutation_map, type=TRAIN, num_examples=-1, num_classes=-1):
         self._permutation_map = permutation_map
@@ -112,16 +129,7 @@ class SimpleExample(Example, ABC):
         if type == MI:
             return
 
-        X, y = self._get_dataset()
-
-        # Filter out the examples where the class is not one of the first num_classes
-        if num_classes != -1:
-            X = X[y < num_classes]
-            y = y[y < num_classes]
-
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42
-        )
+        X_train, X_test, y_train, y_test = self._get_split(num_classes)
 
         # Use a random sample of the training data if num_examples is specified
         if num_examples != -1:
@@ -140,6 +148,15 @@ class SimpleExample(Example, ABC):
     def _get_dataset(self):
         pass
 
+    def _get_split(self, num_classes):
+        """
+        Returns X_train, X_test, y_train, y_test for the first num_classes
+        classes of the dataset. Override to cache the split when many examples
+        are built from the same data.
+        """
+        X, y = self._get_dataset()
+        return split_dataset(X, y, num_classes=num_classes)
+
     def __getitem__(self, i):
         try:
             X = self.X[i].astype(np.float32)
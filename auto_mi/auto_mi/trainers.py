@@ -1,9 +1,11 @@
 from abc import ABC, abstractmethod
+import copy
 
 from tqdm import tqdm
 
 import torch
 import torch.optim as optim
+from torch.func import functional_call, stack_module_state, vmap
 from torch.utils.data import DataLoader
 
 from .base import MetadataBase
@@ -13,10 +15,11 @@ class BaseTrainer(MetadataBase, ABC):
     """
     Implements the training loop based on passed optimisers.
     """
-    def __init__(self, task, epochs, batch_size):
+    def __init__(self, task, epochs, batch_size, num_workers=0):
         self.task = task
         self.epochs = epochs
         self.batch_size = batch_size
+        self.num_workers = num_workers
 
     @abstractmethod
     def train_parallel(self, models, examples, validation_examples):
@@ -27,47 +30,217 @@ class BaseTrainer(MetadataBase, ABC):
 
     def _train_inner(self, models, examples, validation_examples, optimizers, training_dataloaders, l1_penalty_weight=0.):
         train_losses = []
+        for net in models:
+            net.to(self.device)
         for i in tqdm(range(self.epochs), desc='Subject model epochs'):
             for net, optimizer, training_data in zip(models, optimizers, training_dataloaders):
-                net = net.to(self.device)
                 net.train()
                 for inputs, labels in training_data:
-                    optimizer.zero_grad()
-                    inputs, labels = inputs.to(self.device), labels.to(self.device)
-                    output = net(inputs)
-                    loss = self.task.criterion(output, labels)
+                    optimizer.zero_grad(set_to_none=True)
+                    inputs = inputs.to(self.device, non_blocking=True)
+                    labels = labels.to(self.device, non_blocking=True)
+                    with self._autocast():
+                        output = net(inputs)
+                        loss = self.task.criterion(output, labels)
                     if l1_penalty_weight:
                         loss += l1_penalty_weight * sum([torch.abs(param).sum() for param in net.parameters()])
-                    loss.backward()
-                    optimizer.step()
+                    self.scaler.scale(loss).backward()
+                    self.scaler.step(optimizer)
+                    self.scaler.update()
                 net.eval()
                 if i == self.epochs - 1:
-                    train_losses.append(loss.detach().cpu().item())
+                    train_losses.append(loss.detach())
 
-        return [self.evaluate(net, validation_example) for net, validation_example in zip(models, validation_examples)], train_losses
+        # Gather the losses on the device so there is a single sync at the end
+        validation_losses = [
+            self._evaluate_loss(net, validation_example)
+            for net, validation_example in zip(models, validation_examples)
+        ]
+        return _to_list(validation_losses), _to_list(train_losses)
+
+    def _train_inner_vectorised(self, models, examples, validation_examples, params, buffers, optimizer, l1_penalty_weight=0.):
+        """
+        Trains all the models at once as a single batched model, rather than
+        looping over them, which removes the per-model Python and kernel launch
+        overhead. The models must share an architecture, and the examples must
+        be tensor backed and of the same size. params and buffers are the
+        stacked model state that the optimizer was built over.
+
+        This runs in float32 without a GradScaler, since a single scaler over
+        the stacked state would skip the step for every model whenever any one
+        of them overflowed.
+        """
+        if not all(example.tensor_backed for example in examples + validation_examples):
+            raise ValueError(
+                "Vectorised training requires tensor backed examples, see Example.tensor_backed"
+            )
+
+        base_model = copy.deepcopy(models[0]).to('meta')
+
+        def compute_criterion(params, buffers, inputs, labels):
+            output = functional_call(base_model, (params, buffers), (inputs,))
+            return self.task.criterion(output, labels)
+
+        def compute_loss(params, buffers, inputs, labels):
+            loss = compute_criterion(params, buffers, inputs, labels)
+            if l1_penalty_weight:
+                loss += l1_penalty_weight * sum([torch.abs(param).sum() for param in params.values()])
+            return loss
+
+        batched_loss = vmap(compute_loss)
+
+        X = torch.stack([example.X for example in examples]).to(self.device)
+        y = torch.stack([example.y for example in examples]).to(self.device)
+        model_count, example_count = y.shape[:2]
+        model_idx = torch.arange(model_count, device=self.device).unsqueeze(1)
+
+        base_model.train()
+        for _ in tqdm(range(self.epochs), desc='Subject model epochs'):
+            # Each model gets its own shuffle of its example
+            order = torch.rand(model_count, example_count, device=self.device).argsort(dim=1)
+            for batch_idx in order.split(self.batch_size, dim=1):
+                optimizer.zero_grad(set_to_none=True)
+                losses = batched_loss(params, buffers, X[model_idx, batch_idx], y[model_idx, batch_idx])
+                # Summing keeps each model's gradients equal to those of its own loss
+                losses.sum().backward()
+                optimizer.step()
+
+        # Evaluate every model in one batched forward pass
+        validation_X = torch.stack([example.X for example in validation_examples]).to(self.device)
+        validation_y = torch.stack([example.y for example in validation_examples]).to(self.device)
+        base_model.eval()
+        with torch.inference_mode():
+            validation_losses = vmap(compute_criterion)(params, buffers, validation_X, validation_y)
+
+        with torch.no_grad():
+            for i, net in enumerate(models):
+                net.load_state_dict({name: tensor[i] for name, tensor in (params | buffers).items()})
+        train_losses = losses.detach().tolist() if self.epochs else []
+
+        return validation_losses.tolist(), train_losses
+
+    def _autocast(self):
+        """
+        Runs the training forward pass in mixed precision: float16 on GPUs if
+        amp is set, or bfloat16 on CPUs if cpu_bfloat16 is set.
+        """
+        if self.cpu_bfloat16:
+            return torch.autocast('cpu', dtype=torch.bfloat16)
+        return torch.autocast(self.device.type, enabled=self.amp)
+
+    def _get_dataloader(self, example, shuffle=False):
+        """
+        Tensor backed examples are moved to the device once and batched
+        there. Otherwise, pinned host memory lets the non-blocking device
+        copies in the training loop overlap with compute.
+        """
+        if example.tensor_backed:
+            return _TensorBatches(
+                example.X.to(self.device),
+                example.y.to(self.device),
+                self.batch_size,
+                shuffle=shuffle,
+            )
+        return DataLoader(
+            example,
+            batch_size=self.batch_size,
+            shuffle=shuffle,
+            pin_memory=self.device.type == 'cuda',
+            num_workers=self.num_workers,
+            persistent_workers=self.num_workers > 0,
+        )
 
     def evaluate(self, net, example):
-        data = DataLoader(example, batch_size=self.batch_size)
-        inputs, labels = next(iter(data))
-        inputs = inputs.to(self.device)
-        labels = labels.to(self.device)
+        """
+        Returns the mean loss of the net over the whole of the example. Tensor
+        backed examples are evaluated in a single forward pass, others batch by
+        batch. The loss of an empty example is nan.
+        """
+        return self._evaluate_loss(net, example).item()
+
+    def _evaluate_loss(self, net, example):
+        """
+        Like evaluate, but leaves the loss as a tensor on the device so that
+        callers evaluating many nets can sync once.
+        """
+        if example.tensor_backed:
+            batches = [(example.X, example.y)]
+        else:
+            batches = self._get_dataloader(example)
         net.eval()
-        with torch.no_grad():
-            outputs = net(inputs)
-        return self.task.criterion(outputs, labels).detach().cpu().item()
+        with torch.inference_mode():
+            total_loss = torch.zeros((), device=self.device)
+            for inputs, labels in batches:
+                inputs = inputs.to(self.device, non_blocking=True)
+                labels = labels.to(self.device, non_blocking=True)
+                outputs = net(inputs)
+                total_loss += self.task.criterion(outputs, labels) * len(labels)
+            return total_loss / len(example)
+
+
+def _to_list(losses):
+    """
+    Converts a list of scalar loss tensors to floats with a single sync.
+    """
+    return torch.stack(losses).tolist() if losses else []
+
+
+class _TensorBatches:
+    """
+    Iterates over batches of an example held as tensors on the device, so that
+    each epoch is just indexing rather than collating and copying the example
+    from the host.
+    """
+    def __init__(self, X, y, batch_size, shuffle=False):
+        self.X = X
+        self.y = y
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+
+    def __iter__(self):
+        if self.shuffle:
+            order = torch.randperm(len(self.y), device=self.y.device)
+        else:
+            order = torch.arange(len(self.y), device=self.y.device)
+        for batch_idx in order.split(self.batch_size):
+            yield self.X[batch_idx], self.y[batch_idx]
+
+    def __len__(self):
+        return -(-len(self.y) // self.batch_size)
 
 
 class AdamTrainer(BaseTrainer):
-    def __init__(self, task, epochs, batch_size, lr=0.01, weight_decay=0., l1_penalty_weight=0., device=torch.device('cpu')):
-        super().__init__(task, epochs, batch_size)
-        self.device = device
+    def __init__(self, task, epochs, batch_size, lr=0.01, weight_decay=0., l1_penalty_weight=0., device=torch.device('cpu'), num_workers=0, vectorise=False, cpu_bfloat16=False):
+        super().__init__(task, epochs, batch_size, num_workers=num_workers)
+        self.device = torch.device(device)
         self.weight_decay = weight_decay
         self.lr = lr
         self.l1_penalty_weight = l1_penalty_weight
+        self.vectorise = vectorise
+        # Train in float16 mixed precision on GPUs, and optionally in bfloat16
+        # on CPUs, which is only faster on CPUs that support it natively.
+        # Neither applies when vectorised (see _train_inner_vectorised).
+        # Evaluation stays in float32 so that the losses recorded for the
+        # subject models are exact.
+        self.amp = self.device.type == 'cuda' and not vectorise
+        self.cpu_bfloat16 = cpu_bfloat16 and self.device.type == 'cpu' and not vectorise
+        self.scaler = torch.amp.GradScaler('cuda', enabled=self.amp)
 
     def train_parallel(self, nets, examples, validation_examples):
+        if self.vectorise:
+            params, buffers = stack_module_state([net.to(self.device) for net in nets])
+            # The stacked state is a handful of large tensors, so a fused update
+            # is a single kernel per step for all the models.
+            optimizer = optim.Adam(
+                params.values(),
+                lr=self.lr,
+                weight_decay=self.weight_decay,
+                fused=self.device.type == 'cuda',
+            )
+            return self._train_inner_vectorised(nets, examples, validation_examples, params, buffers, optimizer)
+
         optimizers = [optim.Adam(net.parameters(), lr=self.lr, weight_decay=self.weight_decay) for net in nets]
-        training_dataloaders = [DataLoader(example, batch_size=self.batch_size, shuffle=True) for example in examples]
+        training_dataloaders = [self._get_dataloader(example, shuffle=True) for example in examples]
 
         validation_losses = self._train_inner(nets, examples, validation_examples, optimizers, training_dataloaders)
 
@@ -78,4 +251,6 @@ class AdamTrainer(BaseTrainer):
             'weight_decay': self.weight_decay,
             'lr': self.lr,
             'l1_penalty_weight': self.l1_penalty_weight,
+            'amp': self.amp,
+            'cpu_bfloat16': self.cpu_bfloat16,
         }
\ No newline at end of file
@@ -1,5 +1,9 @@
+from functools import lru_cache
 from itertools import combinations
 import os
+import tempfile
+
+import numpy as np
 import torch
 
 
@@ -9,27 +13,96 @@ import torch.nn as nn
 
 from auto_mi.base import MetadataBase
 from auto_mi.io import DirModelWriter, TarModelWriter
-from auto_mi.tasks import SimpleTask, SimpleExample, TRAIN, MI
+from auto_mi.tasks import SimpleTask, SimpleExample, TRAIN, MI, split_dataset
 from auto_mi.cli import train_cli
 
 
 TRAIN_RATIO = 0.7
 
+# Bump this whenever _load_digits or split_dataset change, so that a stale
+# cached split is never loaded
+DIGITS_SPLIT_CACHE_VERSION = 1
+SPLIT_NAMES = ('X_train', 'X_test', 'y_train', 'y_test')
+
+def _load_digits():
+    digits_dataset = datasets.load_digits()
+    X = digits_dataset.data.astype(np.float32).reshape(-1, 8, 8)
+    y = digits_dataset.target
+    return X, y
+
+
+@lru_cache(maxsize=None)
+def _load_digits_split(num_classes):
+    """
+    Loads and splits the digits dataset once per process rather than once per
+    example. The split is also saved under ./data, so that later processes
+    memory map it instead of reloading the dataset. The returned arrays are
+    shared, so must not be modified in place.
+    """
+    cache_dir = './data'
+    paths = [
+        os.path.join(cache_dir, f'digits_split_v{DIGITS_SPLIT_CACHE_VERSION}_{num_classes}_{name}.npy')
+        for name in SPLIT_NAMES
+    ]
+    if all(os.path.exists(path) for path in paths):
+        # Copy-on-write so that torch can wrap the arrays without copying them
+        return [np.load(path, mmap_mode='c') for path in paths]
+
+    X, y = _load_digits()
+    split = split_dataset(X, y, num_classes=num_classes)
+
+    # The cache is only an optimisation, so carry on with the split if it
+    # can't be written.
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        for path, array in zip(paths, split):
+            # Write then rename, as many jobs, possibly on different hosts
+            # sharing this directory, may be creating the cache at once
+            with tempfile.NamedTemporaryFile(
+                dir=cache_dir, prefix='digits_split_', suffix='.tmp', delete=False
+            ) as f:
+                try:
+                    np.save(f, array)
+                except BaseException:
+                    os.remove(f.name)
+                    raise
+            os.replace(f.name, path)
+    except OSError:
+        pass
+
+    return split
+
+
 class PermutedDigitsTask(SimpleTask):
     def __init__(self, **kwargs):
         super().__init__(PermutedDigitsExample, (8, 8,), **kwargs)
 
+    def criterion(self, x, y):
+        # DigitsClassifier returns logits, so fuse the log softmax into the loss
+        return F.cross_entropy(x, y)
+
 
 class PermutedDigitsExample(SimpleExample):
+    tensor_backed = True
+
+    def __init__(self, permutation_map, type=TRAIN, **kwargs):
+        super().__init__(permutation_map, type=type, **kwargs)
+        if type == MI:
+            return
+
+        # Hold the split as tensors with the permutation already applied, so
+        # fetching an item is just indexing.
+        self.X = torch.from_numpy(np.asarray(self.X))
+        self.y = torch.tensor(self._permutation_map)[torch.as_tensor(np.asarray(self.y))]
+
     def _get_dataset(self):
-        digits_dataset = datasets.load_digits()
-        X = digits_dataset.data
-        y = digits_dataset.target
-        return X, y
+        return _load_digits()
+
+    def _get_split(self, num_classes):
+        return _load_digits_split(num_classes)
 
     def __getitem__(self, i):
-        X, y = super().__getitem__(i)
-        return X.reshape(8, 8), y
+        return self.X[i], self.y[i]
 
 
 class DigitsClassifier(nn.Module, MetadataBase):
@@ -71,8 +144,7 @@ class DigitsClassifier(nn.Module, MetadataBase):
         x = F.relu(F.max_pool2d(self.conv2(x), 2))
         x = x.view(-1, self._conv_channels * 2 * 2)
         x = F.relu(self.fc1(x))
-        x = self.fc2(x)
-        return F.log_softmax(x, dim=1)
+        return self.fc2(x)
 
     def get_metadata(self):
         md = super().get_metadata()